@@ -4,23 +4,86 @@ Handles CV analysis and evaluation using the Gemini AI API.
 """
 
 import os
-import json
 import asyncio
-from typing import Dict, List, Optional
-from portkey import Portkey
+import httpx
+from typing import Dict, List, Optional, Tuple
+from portkey import AsyncPortkey
+from tenacity import (
+    AsyncRetrying,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_random_exponential
+)
+try:
+    from orjson import loads as _json_loads  # SIMD-accelerated JSON
+except ImportError:
+    from json import loads as _json_loads
+
+_REQUIRED_FIELDS = frozenset({
+    "full_name", "email", "education",
+    "experience", "skills", "required_skills_match",
+    "preferred_skills_match", "recommendation",
+    "justification"
+})
+
+# gemini-pro-vision's output token limit
+_MAX_OUTPUT_TOKENS = 2048
+
+# SDK exception classes for network failures; the timeout error subclasses
+# the connection error. Matched by name, as the Portkey SDK and its vendored
+# OpenAI client each define their own.
+_SDK_CONNECTION_ERRORS = frozenset({"APIConnectionError", "APITimeoutError"})
+
+def is_transient_error(error: BaseException) -> bool:
+    """Tell rate limits, server errors and network failures from permanent errors."""
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    if status_code is not None:
+        return status_code == 429 or status_code >= 500
+    if any(cls.__name__ in _SDK_CONNECTION_ERRORS for cls in type(error).__mro__):
+        return True
+    if isinstance(error, (httpx.TransportError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    # Fall back to the underlying failure the SDK wrapped, if any
+    return error.__cause__ is not None and is_transient_error(error.__cause__)
+
+# Shared HTTP/2 connection pool, so concurrent CV requests multiplex over
+# kept-alive connections instead of opening a new TLS session each
+_http_client: Optional[httpx.AsyncClient] = None
+
+def _get_http_client() -> httpx.AsyncClient:
+    """Return the shared async HTTP client, creating it on first use."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            http2=True,
+            timeout=60.0,
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
+        )
+    return _http_client
+
+async def close_http_client():
+    """Close the shared HTTP client; called on application shutdown."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
 
 class GeminiAIClient:
     def __init__(self, api_key: str):
         """Initialize the Gemini AI client."""
-        self.portkey_client = Portkey(
+        self.portkey_client = AsyncPortkey(
             api_key=api_key,
-            virtual_key=os.getenv("PORTKEY_VIRTUAL_KEY")
+            virtual_key=os.getenv("PORTKEY_VIRTUAL_KEY"),
+            http_client=_get_http_client()
         )
 
     async def analyze_cv(
         self, 
         base64_images: List[str], 
-        role_data: Dict
+        role_data: Dict,
+        prompt: Optional[str] = None
     ) -> Dict:
         """
         Analyze CV images using Gemini AI.
@@ -28,18 +91,22 @@ class GeminiAIClient:
         Args:
             base64_images: List of base64 encoded CV images
             role_data: Job role requirements and criteria
+            prompt: Prebuilt analysis prompt for role_data, if available
             
         Returns:
             Dict containing analysis results
         """
         try:
             # Prepare the prompt for CV analysis
-            prompt = self._build_analysis_prompt(role_data)
+            if prompt is None:
+                prompt = self._build_analysis_prompt(role_data)
             
             # Call Gemini AI API
             response = await self._call_gemini_api(
-                base64_images=base64_images,
-                prompt=prompt
+                content=[
+                    {"type": "text", "text": prompt},
+                    *self._image_parts(base64_images)
+                ]
             )
             
             # Parse and validate response
@@ -49,7 +116,47 @@ class GeminiAIClient:
             print(f"Error in CV analysis: {str(e)}")
             raise
 
-    def _build_analysis_prompt(self, role_data: Dict) -> str:
+    async def analyze_cvs_batch(
+        self,
+        cvs: List[Tuple[List[str], str]],
+        role_data: Dict,
+        prompt: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Analyze several CVs in a single Gemini AI request.
+        
+        Args:
+            cvs: List of (base64 encoded CV images, CV identifier) pairs
+            role_data: Job role requirements and criteria
+            prompt: Prebuilt batch prompt for role_data and len(cvs), if available
+            
+        Returns:
+            List of analysis results, in the same order as cvs
+        """
+        try:
+            # Shared prompt, then each CV's images behind a numbered marker
+            if prompt is None:
+                prompt = self._build_batch_prompt(role_data, len(cvs))
+            content = [{"type": "text", "text": prompt}]
+            for i, (base64_images, cv_id) in enumerate(cvs, start=1):
+                content.append({"type": "text", "text": f"--- CV {i} ({cv_id}) ---"})
+                content.extend(self._image_parts(base64_images))
+            
+            # Call Gemini AI API
+            response = await self._call_gemini_api(
+                content=content,
+                max_tokens=min(2000 * len(cvs), _MAX_OUTPUT_TOKENS)
+            )
+            
+            # Parse and validate response
+            return self._parse_batch_response(response, len(cvs))
+            
+        except Exception as e:
+            print(f"Error in batch CV analysis: {str(e)}")
+            raise
+
+    @staticmethod
+    def _build_analysis_prompt(role_data: Dict) -> str:
         """Build the analysis prompt from role data."""
         return f"""
         Analyze this CV for the position of {role_data['position']}.
@@ -74,43 +181,73 @@ class GeminiAIClient:
         Format the response as JSON.
         """
 
+    @staticmethod
+    def _build_batch_prompt(role_data: Dict, n: int) -> str:
+        """Build a single analysis prompt covering n CVs."""
+        sections = "\n".join(
+            f"        CV #{i}: the images following the \"--- CV {i}\" marker."
+            for i in range(1, n + 1)
+        )
+        return f"""
+        Analyze the following {n} CVs for the position of {role_data['position']}.
+        Evaluate each CV independently.
+        
+        Required Skills:
+        {role_data['requirements_must_have']}
+        
+        Preferred Skills:
+        {role_data['requirements_nice_to_have']}
+        
+{sections}
+        
+        For each CV, please provide:
+        1. Candidate's full name
+        2. Email address
+        3. Educational qualifications
+        4. Years of experience
+        5. Key skills assessment
+        6. Match percentage for required skills
+        7. Match percentage for preferred skills
+        8. Overall recommendation (ACCEPT/REJECT/REVIEW)
+        9. Justification for recommendation
+        
+        Format the response as a JSON array with exactly {n} objects,
+        one per CV, in the same order as the CVs above. Each object must
+        include a "cv_number" field holding the number of the CV it
+        describes (1 to {n}).
+        """
+
+    def _image_parts(self, base64_images: List[str]) -> List[Dict]:
+        """Build the message content parts for a CV's images."""
+        return [{
+            "type": "image",
+            "image": img
+        } for img in base64_images]
+
     async def _call_gemini_api(
         self, 
-        base64_images: List[str], 
-        prompt: str
+        content: List[Dict], 
+        max_tokens: int = 2000
     ) -> Dict:
-        """Call the Gemini AI API with retries."""
-        max_retries = 3
-        retry_delay = 1
-        
-        for attempt in range(max_retries):
-            try:
-                response = await self.portkey_client.chat.completions.create(
+        """Call the Gemini AI API, retrying transient failures with jittered backoff."""
+        async for attempt in AsyncRetrying(
+            wait=wait_random_exponential(multiplier=1, max=30),
+            stop=stop_after_attempt(3),
+            retry=retry_if_exception(is_transient_error),
+            reraise=True
+        ):
+            with attempt:
+                return await self.portkey_client.chat.completions.create(
                     messages=[
                         {
                             "role": "user",
-                            "content": [
-                                {
-                                    "type": "text",
-                                    "text": prompt
-                                },
-                                *[{
-                                    "type": "image",
-                                    "image": img
-                                } for img in base64_images]
-                            ]
+                            "content": content
                         }
                     ],
                     model="gemini-pro-vision",
-                    max_tokens=2000,
+                    max_tokens=max_tokens,
                     temperature=0.1
                 )
-                return response
-                
-            except Exception as e:
-                if attempt == max_retries - 1:
-                    raise
-                await asyncio.sleep(retry_delay * (2 ** attempt))
 
     def _parse_response(self, response: Dict) -> Dict:
         """Parse and validate the API response."""
@@ -119,21 +256,40 @@ class GeminiAIClient:
             content = response.choices[0].message.content
             
             # Parse JSON response
-            result = json.loads(content)
+            result = _json_loads(content)
             
             # Validate required fields
-            required_fields = [
-                "full_name", "email", "education", 
-                "experience", "skills", "required_skills_match",
-                "preferred_skills_match", "recommendation",
-                "justification"
-            ]
-            
-            for field in required_fields:
-                if field not in result:
-                    raise ValueError(f"Missing required field: {field}")
+            self._validate_result(result)
                     
             return result
             
         except Exception as e:
-            raise ValueError(f"Failed to parse API response: {str(e)}") 
\ No newline at end of file
+            raise ValueError(f"Failed to parse API response: {str(e)}")
+
+    def _parse_batch_response(self, response: Dict, n: int) -> List[Dict]:
+        """Parse and validate a batch API response holding n results."""
+        try:
+            # Extract the response content
+            content = response.choices[0].message.content
+            
+            # Parse JSON array response
+            results = _json_loads(content)
+            if not isinstance(results, list) or len(results) != n:
+                raise ValueError(f"Expected a JSON array of {n} results")
+            
+            # Validate every result, and that it describes the CV at its position
+            for i, result in enumerate(results, start=1):
+                self._validate_result(result)
+                if str(result.pop("cv_number", None)) != str(i):
+                    raise ValueError(f"Result {i} does not describe CV {i}")
+                
+            return results
+            
+        except Exception as e:
+            raise ValueError(f"Failed to parse batch API response: {str(e)}")
+
+    def _validate_result(self, result: Dict):
+        """Check that a single analysis result has all required fields."""
+        missing = _REQUIRED_FIELDS - result.keys()
+        if missing:
+            raise ValueError(f"Missing required fields: {sorted(missing)}") 
\ No newline at end of file
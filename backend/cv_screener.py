@@ -5,18 +5,74 @@ Handles PDF processing, image conversion, and result compilation.
 
 import os
 import io
+import json
+import asyncio
+import hashlib
+import uuid
 import zipfile
-import magic
+import zlib
+import diskcache
 import pandas as pd
-from PIL import Image
-import base64
-from typing import Dict, List, Tuple, Optional
+from functools import lru_cache
+from typing import Dict, Iterator, List, Tuple, Optional, Union
 from datetime import datetime
+try:
+    from blake3 import blake3 as _content_hash  # SIMD-accelerated hashing
+except ImportError:
+    from hashlib import blake2b as _content_hash
+try:
+    # SIMD-accelerated base64, returning str without an extra decode copy
+    from pybase64 import b64encode_as_string as _b64encode_str
+except ImportError:
+    import base64
+
+    def _b64encode_str(data: bytes) -> str:
+        return base64.b64encode(data).decode('ascii')
+
+from .api_client import GeminiAIClient, is_transient_error
+
+_DATA_URI_PREFIXES = {
+    "png": "data:image/png;base64,",
+    "jpeg": "data:image/jpeg;base64,"
+}
+_MAX_RENDER_ZOOM = 1.5
+_MAX_IMAGE_SIZE = 1024  # pixels along a page's longest side
+_JPEG_QUALITY = 80
+_ZIP_READ_CHUNK_SIZE = 1 << 20  # 1 MiB
+_ZIP_MAX_PREALLOC = 64 << 20  # never trust a declared entry size beyond 64 MiB
+_PDF_MAGIC = b"%PDF-"
+_REPORT_COLUMNS = [
+    "filename", "full_name", "email", "education",
+    "experience", "skills", "required_skills_match",
+    "preferred_skills_match", "recommendation",
+    "justification", "truncated", "error"
+]
+
+@lru_cache(maxsize=None)
+def _get_analysis_cache() -> diskcache.Cache:
+    """Open the persistent analysis cache shared by all screeners."""
+    return diskcache.Cache(
+        os.getenv("CV_CACHE_DIR", "cache"),
+        size_limit=int(os.getenv("CV_CACHE_SIZE_LIMIT", str(1 << 30))),
+        eviction_policy="least-recently-used"
+    )
 
 class CVScreener:
-    def __init__(self, role_data: Dict):
-        """Initialize the CV screener with role data."""
+    def __init__(self, role_data: Dict, client: Optional[GeminiAIClient] = None):
+        """Initialize the CV screener with role data and a shared AI client."""
         self.role_data = role_data
+        self.client = client or GeminiAIClient(os.getenv("PORTKEY_API_KEY"))
+        self.cache = _get_analysis_cache()
+        self.cache_ttl = int(os.getenv("CV_CACHE_TTL", str(7 * 24 * 3600)))
+        self.img_format = os.getenv("CV_IMG_FORMAT", "jpeg").lower()
+        if self.img_format not in _DATA_URI_PREFIXES:
+            raise ValueError(f"Unsupported CV_IMG_FORMAT: {self.img_format}")
+        self.max_pages = max(1, int(os.getenv("CV_MAX_PAGES", "4")))
+        self._analysis_prompt = GeminiAIClient._build_analysis_prompt(role_data)
+        self._batch_prompts: Dict[int, str] = {}
+        self._role_hash = hashlib.sha1(
+            json.dumps(role_data, sort_keys=True).encode()
+        ).hexdigest()
         self.results = []
         self.processed_count = 0
         self.total_count = 0
@@ -32,123 +88,232 @@ class CVScreener:
         Returns:
             Path to the generated Excel report
         """
-        try:
-            # Reset counters
-            self.processed_count = 0
-            self.results = []
-            
-            # Create temporary directory
-            temp_dir = "temp"
-            os.makedirs(temp_dir, exist_ok=True)
-            
-            # Extract and validate ZIP contents
-            pdf_files = self._extract_zip(zip_file, temp_dir)
-            self.total_count = len(pdf_files)
-            
-            # Process each PDF
-            for pdf_path in pdf_files:
+        # Reset counters
+        self.processed_count = 0
+        self.results = []
+        
+        # Extract and validate ZIP contents in memory
+        pdf_files = self._extract_zip(zip_file)
+        self.total_count = len(pdf_files)
+        
+        # Group PDFs into batches of CV_BATCH_SIZE per API request
+        batch_size = max(1, int(os.getenv("CV_BATCH_SIZE", "1")))
+        batches = [
+            pdf_files[i:i + batch_size]
+            for i in range(0, len(pdf_files), batch_size)
+        ]
+        
+        # Process batches concurrently, bounded by CV_CONCURRENCY
+        sem = asyncio.Semaphore(max(1, int(os.getenv("CV_CONCURRENCY", "8"))))
+
+        async def run(batch: List[Tuple[str, bytes]]) -> List[Dict]:
+            async with sem:
                 try:
-                    await self._process_single_cv(pdf_path)
+                    return await self._process_batch(batch)
                 except Exception as e:
-                    print(f"Error processing {pdf_path}: {str(e)}")
-                    self.results.append({
-                        "filename": os.path.basename(pdf_path),
+                    filenames = [filename for filename, _ in batch]
+                    print(f"Error processing {', '.join(filenames)}: {str(e)}")
+                    return [{
+                        "filename": filename,
                         "error": str(e)
-                    })
+                    } for filename in filenames]
                 finally:
-                    self.processed_count += 1
-                    
-            # Generate report
-            return self._generate_excel_report()
-            
-        finally:
-            # Cleanup
-            if os.path.exists(temp_dir):
-                for file in os.listdir(temp_dir):
-                    os.remove(os.path.join(temp_dir, file))
-                os.rmdir(temp_dir)
-
-    def _extract_zip(self, zip_file: bytes, extract_path: str) -> List[str]:
-        """Extract and validate ZIP contents."""
+                    self.processed_count += len(batch)
+
+        batch_results = await asyncio.gather(*[run(b) for b in batches])
+        self.results = [row for rows in batch_results for row in rows]
+                
+        # Generate report off the event loop
+        return await asyncio.to_thread(self._generate_excel_report)
+
+    def _extract_zip(self, zip_file: bytes) -> List[Tuple[str, bytes]]:
+        """Read and validate ZIP contents as (filename, PDF bytes) pairs."""
         pdf_files = []
         
         with zipfile.ZipFile(io.BytesIO(zip_file)) as zf:
-            for file in zf.namelist():
-                if not file.lower().endswith('.pdf'):
+            for info in zf.infolist():
+                if info.is_dir() or not info.filename.lower().endswith('.pdf'):
                     continue
                     
-                # Extract the PDF
-                zf.extract(file, extract_path)
-                pdf_path = os.path.join(extract_path, file)
+                # Read the PDF into memory
+                try:
+                    data = self._read_zip_entry(zf, info)
+                except (ValueError, zipfile.BadZipFile, EOFError, zlib.error) as e:
+                    print(f"Skipping {info.filename}: {str(e)}")
+                    continue
                 
                 # Validate PDF
-                if self._is_valid_pdf(pdf_path):
-                    pdf_files.append(pdf_path)
-                else:
-                    os.remove(pdf_path)
+                if self._is_valid_pdf(data):
+                    pdf_files.append((os.path.basename(info.filename), data))
                     
         return pdf_files
 
-    def _is_valid_pdf(self, file_path: str) -> bool:
-        """Validate if file is a proper PDF."""
-        try:
-            mime = magic.Magic(mime=True)
-            file_type = mime.from_file(file_path)
-            return file_type == 'application/pdf'
-        except Exception:
-            return False
-
-    async def _process_single_cv(self, pdf_path: str):
-        """Process a single CV file."""
-        self.current_status = f"Processing {os.path.basename(pdf_path)}"
+    def _read_zip_entry(self, zf: zipfile.ZipFile, info: zipfile.ZipInfo) -> bytearray:
+        """Read a ZIP entry in large chunks into a buffer preallocated to its size."""
+        # The declared size comes from the upload, so cap the preallocation
+        # and let the buffer grow past it if the entry really is larger
+        buf = bytearray(min(info.file_size, _ZIP_MAX_PREALLOC))
+        off = 0
         
-        # Convert PDF to images
-        images = self._pdf_to_images(pdf_path)
+        with zf.open(info) as f:
+            while chunk := f.read(_ZIP_READ_CHUNK_SIZE):
+                buf[off:off + len(chunk)] = chunk
+                off += len(chunk)
+                
+        if off != info.file_size:
+            raise ValueError(
+                f"Entry size {off} does not match declared size {info.file_size}"
+            )
+        del buf[off:]
+        return buf
+
+    def _is_valid_pdf(self, data: bytes) -> bool:
+        """Validate if data is a proper PDF by its magic number."""
+        return data.startswith(_PDF_MAGIC)
+
+    async def _process_batch(self, pdf_files: List[Tuple[str, bytes]]) -> List[Dict]:
+        """Process a batch of CV files with a single AI request."""
+        # Serve CVs already analyzed for this role from the cache; hashing
+        # and the SQLite lookups run off the event loop
+        keys, analyses = await asyncio.to_thread(self._load_cached, pdf_files)
+        pending = [i for i, analysis in enumerate(analyses) if analysis is None]
         
-        # Convert images to base64
-        base64_images = []
-        for img in images:
-            buffered = io.BytesIO()
-            img.save(buffered, format="PNG")
-            img_str = base64.b64encode(buffered.getvalue()).decode()
-            base64_images.append(f"data:image/png;base64,{img_str}")
+        if pending:
+            filenames = [pdf_files[i][0] for i in pending]
+            self.current_status = f"Processing {', '.join(filenames)}"
+            
+            # Convert every pending PDF to base64 images in parallel, off the event loop;
+            # a PDF that fails to render only fails its own row
+            rendered = await asyncio.gather(*[
+                asyncio.to_thread(self._render_cv, pdf_files[i][1])
+                for i in pending
+            ], return_exceptions=True)
+            
+            renderable = []
+            for i, result in zip(pending, rendered):
+                if isinstance(result, Exception):
+                    print(f"Error processing {pdf_files[i][0]}: {str(result)}")
+                    analyses[i] = {"error": str(result)}
+                else:
+                    renderable.append((i, *result))
             
-        # Get AI analysis
-        from .api_client import GeminiAIClient
-        client = GeminiAIClient(os.getenv("PORTKEY_API_KEY"))
-        analysis = await client.analyze_cv(base64_images, self.role_data)
+            # Get AI analysis
+            fresh = await self._analyze_cvs([
+                (images, pdf_files[i][0]) for i, images, _ in renderable
+            ])
+                
+            to_cache = {}
+            for (i, _, truncated), analysis in zip(renderable, fresh):
+                if isinstance(analysis, Exception):
+                    print(f"Error processing {pdf_files[i][0]}: {str(analysis)}")
+                    analyses[i] = {"error": str(analysis)}
+                    continue
+                analysis = {**analysis, "truncated": truncated}
+                to_cache[keys[i]] = analysis
+                analyses[i] = analysis
+                
+            if to_cache:
+                await asyncio.to_thread(self._store_cached, to_cache)
         
-        # Store results
-        self.results.append({
-            "filename": os.path.basename(pdf_path),
+        return [{
+            "filename": filename,
             **analysis
-        })
+        } for (filename, _), analysis in zip(pdf_files, analyses)]
 
-    def _pdf_to_images(self, pdf_path: str) -> List[Image.Image]:
-        """Convert PDF pages to images."""
-        try:
-            import fitz  # PyMuPDF
-            doc = fitz.open(pdf_path)
-            images = []
+    async def _analyze_cvs(
+        self,
+        cvs: List[Tuple[List[str], str]]
+    ) -> List[Union[Dict, Exception]]:
+        """Analyze (images, filename) pairs, falling back to one request per CV."""
+        if not cvs:
+            return []
             
-            for page in doc:
-                pix = page.get_pixmap(matrix=fitz.Matrix(1.5, 1.5))
-                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                images.append(img)
+        if len(cvs) > 1:
+            try:
+                return await self.client.analyze_cvs_batch(
+                    cvs, self.role_data, prompt=self._batch_prompt(len(cvs))
+                )
+            except Exception as e:
+                # A malformed result or a rejected batch request should not
+                # cost the whole batch; transient failures were already retried
+                if is_transient_error(e):
+                    raise
+                print(f"Unusable batch response, analyzing CVs one by one: {str(e)}")
                 
-            return images
-            
+        return await asyncio.gather(*[
+            self.client.analyze_cv(images, self.role_data, prompt=self._analysis_prompt)
+            for images, _ in cvs
+        ], return_exceptions=True)
+
+    def _batch_prompt(self, n: int) -> str:
+        """Return the batch prompt for n CVs, building it once per batch size."""
+        if n not in self._batch_prompts:
+            self._batch_prompts[n] = GeminiAIClient._build_batch_prompt(self.role_data, n)
+        return self._batch_prompts[n]
+
+    def _load_cached(
+        self,
+        pdf_files: List[Tuple[str, bytes]]
+    ) -> Tuple[List[str], List[Optional[Dict]]]:
+        """Return the cache keys of the PDFs and their cached analyses, if any."""
+        keys = [self._cache_key(data) for _, data in pdf_files]
+        return keys, [self.cache.get(key) for key in keys]
+
+    def _store_cached(self, analyses: Dict[str, Dict]):
+        """Cache analyses by key; entries expire after CV_CACHE_TTL seconds."""
+        for key, analysis in analyses.items():
+            self.cache.set(key, analysis, expire=self.cache_ttl)
+
+    def _cache_key(self, data: bytes) -> str:
+        """Key a CV's analysis by its content, the role and how it was rendered."""
+        return (
+            f"{_content_hash(data).hexdigest()}|{self._role_hash}"
+            f"|{self.max_pages}|{self.img_format}"
+        )
+
+    def _render_cv(self, data: bytes) -> Tuple[List[str], bool]:
+        """Render a CV to base64 images and report whether pages were dropped."""
+        try:
+            import fitz  # PyMuPDF
+            with fitz.open(stream=data, filetype="pdf") as doc:
+                return list(self._pdf_to_base64_images(doc)), doc.page_count > self.max_pages
         except Exception as e:
             raise ValueError(f"Failed to convert PDF to images: {str(e)}")
 
+    def _pdf_to_base64_images(self, doc) -> Iterator[str]:
+        """Render up to max_pages PDF pages straight to base64 encoded image data URIs."""
+        import fitz  # PyMuPDF
+        prefix = _DATA_URI_PREFIXES[self.img_format]
+        
+        for i, page in enumerate(doc):
+            if i >= self.max_pages:
+                break
+                
+            # Render no larger than the model's useful input resolution
+            zoom = min(
+                _MAX_RENDER_ZOOM,
+                _MAX_IMAGE_SIZE / max(page.rect.width, page.rect.height)
+            )
+            # Encode without keeping a reference, so each pixmap is freed
+            # before the next page is rendered
+            yield prefix + self._encode_pixmap(
+                page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+            )
+
+    def _encode_pixmap(self, pix) -> str:
+        """Encode a pixmap in the configured image format and return it as base64."""
+        if self.img_format == "jpeg":
+            return _b64encode_str(pix.tobytes("jpeg", jpg_quality=_JPEG_QUALITY))
+        return _b64encode_str(pix.tobytes("png"))
+
     def _generate_excel_report(self) -> str:
         """Generate Excel report from results."""
         try:
             # Create results directory
             os.makedirs("results", exist_ok=True)
             
-            # Prepare data for Excel
-            df = pd.DataFrame(self.results)
+            # Prepare data for Excel with a fixed column layout
+            df = pd.DataFrame.from_records(self.results, columns=_REPORT_COLUMNS)
             
             # Add metadata
             metadata = {
@@ -159,11 +324,11 @@ class CVScreener:
                 "Total CVs Processed": len(self.results)
             }
             
-            # Create Excel writer
+            # Create Excel writer; the suffix keeps concurrent reports apart
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_path = f"results/cv_analysis_{timestamp}.xlsx"
+            output_path = f"results/cv_analysis_{timestamp}_{uuid.uuid4().hex[:8]}.xlsx"
             
-            with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
+            with pd.ExcelWriter(output_path, engine='xlsxwriter') as writer:
                 # Write metadata
                 pd.DataFrame([metadata]).T.to_excel(writer, sheet_name='Metadata')
                 
@@ -5,20 +5,36 @@ Handles HTTP endpoints and background tasks.
 
 import os
 import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
 from typing import Dict, List, Optional
 from fastapi import FastAPI, UploadFile, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, ORJSONResponse
 from pydantic import BaseModel
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
+from .api_client import close_http_client
 from .cv_screener import CVScreener
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Size the PDF rendering thread pool and close shared clients on exit."""
+    executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+    asyncio.get_running_loop().set_default_executor(executor)
+    yield
+    await close_http_client()
+    executor.shutdown(wait=False)
+
 # Initialize FastAPI app
 app = FastAPI(
     title="CV Screener API",
     description="AI-powered CV screening and analysis API",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -30,8 +46,41 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Store tasks and their status
-tasks = {}
+@dataclass
+class TaskState:
+    """In-memory state of a processing task."""
+    status: str = "PROCESSING"
+    progress: Dict = field(default_factory=lambda: {
+        "processed": 0,
+        "total": 0,
+        "status": "Initializing",
+        "percentage": 0
+    })
+    result_path: Optional[str] = None
+    error: Optional[str] = None
+
+# Store tasks and their status, evicting the least recently used beyond TASKS_MAX
+TASKS_MAX = 1024
+tasks: "OrderedDict[str, TaskState]" = OrderedDict()
+_tasks_lock = asyncio.Lock()
+
+async def add_task(task_id: str, state: TaskState):
+    """Register a task, evicting the least recently used one when full."""
+    async with _tasks_lock:
+        while len(tasks) >= TASKS_MAX:
+            tasks.popitem(last=False)
+        tasks[task_id] = state
+
+async def get_task(task_id: str) -> TaskState:
+    """Look up a task and mark it as recently used."""
+    async with _tasks_lock:
+        if task_id not in tasks:
+            raise HTTPException(
+                status_code=404,
+                detail="Task not found"
+            )
+        tasks.move_to_end(task_id)
+        return tasks[task_id]
 
 class JobRole(BaseModel):
     """Job role requirements model."""
@@ -79,22 +128,13 @@ async def screen_cvs(
         task_id = str(uuid.uuid4())
         
         # Initialize task status
-        tasks[task_id] = {
-            "status": "PROCESSING",
-            "progress": {
-                "processed": 0,
-                "total": 0,
-                "status": "Initializing",
-                "percentage": 0
-            },
-            "result_path": None,
-            "error": None
-        }
+        state = TaskState()
+        await add_task(task_id, state)
         
         # Start background processing
         background_tasks.add_task(
             process_cvs_task,
-            task_id,
+            state,
             content,
             role
         )
@@ -108,7 +148,7 @@ async def screen_cvs(
         )
 
 async def process_cvs_task(
-    task_id: str,
+    state: TaskState,
     zip_content: bytes,
     role: JobRole
 ):
@@ -126,63 +166,48 @@ async def process_cvs_task(
         result_path = await screener.process_zip(zip_content)
         
         # Update task status
-        tasks[task_id].update({
-            "status": "COMPLETED",
-            "progress": screener.get_progress(),
-            "result_path": result_path
-        })
+        state.status = "COMPLETED"
+        state.progress = screener.get_progress()
+        state.result_path = result_path
         
     except Exception as e:
         # Update task status with error
-        tasks[task_id].update({
-            "status": "FAILED",
-            "error": str(e)
-        })
+        state.status = "FAILED"
+        state.error = str(e)
 
-@app.get("/task-status/{task_id}")
-async def get_task_status(task_id: str) -> TaskStatus:
+@app.get("/task-status/{task_id}", response_model=TaskStatus)
+async def get_task_status(task_id: str) -> ORJSONResponse:
     """Get status of a processing task."""
-    if task_id not in tasks:
-        raise HTTPException(
-            status_code=404,
-            detail="Task not found"
-        )
-        
-    task = tasks[task_id]
-    return TaskStatus(
-        task_id=task_id,
-        status=task["status"],
-        progress=task["progress"],
-        result_path=task["result_path"],
-        error=task["error"]
-    )
+    task = await get_task(task_id)
+    # Serialize the state directly rather than rebuilding a TaskStatus per poll
+    return ORJSONResponse(content={
+        "task_id": task_id,
+        "status": task.status,
+        "progress": task.progress,
+        "result_path": task.result_path,
+        "error": task.error
+    })
 
 @app.get("/download-result/{task_id}")
 async def download_result(task_id: str) -> FileResponse:
     """Download the Excel report for a completed task."""
-    if task_id not in tasks:
-        raise HTTPException(
-            status_code=404,
-            detail="Task not found"
-        )
-        
-    task = tasks[task_id]
-    if task["status"] != "COMPLETED":
+    task = await get_task(task_id)
+    if task.status != "COMPLETED":
         raise HTTPException(
             status_code=400,
             detail="Task not completed"
         )
         
-    if not task["result_path"] or not os.path.exists(task["result_path"]):
+    if not task.result_path or not os.path.exists(task.result_path):
         raise HTTPException(
             status_code=404,
             detail="Result file not found"
         )
         
     return FileResponse(
-        task["result_path"],
+        task.result_path,
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        filename=os.path.basename(task["result_path"])
+        filename=os.path.basename(task.result_path)
     )
 
 @app.get("/health")
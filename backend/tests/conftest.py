@@ -0,0 +1,20 @@
+"""
+Test configuration for the backend.
+Stub the Portkey SDK when it is not importable; tests inject their own AI client.
+"""
+
+import sys
+import types
+
+try:
+    import portkey  # noqa: F401
+except ImportError:
+    class _UnavailablePortkey:
+        """Placeholder for the Portkey SDK clients, which tests never call."""
+        def __init__(self, **kwargs):
+            raise RuntimeError("Portkey SDK is not installed")
+
+    _stub = types.ModuleType("portkey")
+    _stub.Portkey = _UnavailablePortkey
+    _stub.AsyncPortkey = _UnavailablePortkey
+    sys.modules["portkey"] = _stub
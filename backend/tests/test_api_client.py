@@ -0,0 +1,78 @@
+"""
+Tests for parsing and validating Gemini AI responses.
+"""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from backend.api_client import GeminiAIClient, is_transient_error
+
+ANALYSIS = {
+    "full_name": "Jane Doe",
+    "email": "jane@example.com",
+    "education": "BSc",
+    "experience": "5 years",
+    "skills": "Python",
+    "required_skills_match": 100,
+    "preferred_skills_match": 50,
+    "recommendation": "ACCEPT",
+    "justification": "Strong match"
+}
+
+
+def make_response(content) -> SimpleNamespace:
+    """Wrap content the way the chat completions API returns it."""
+    message = SimpleNamespace(content=json.dumps(content))
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+@pytest.fixture
+def client() -> GeminiAIClient:
+    """A client for parsing only, without a Portkey connection."""
+    return GeminiAIClient.__new__(GeminiAIClient)
+
+
+def test_parse_batch_response_checks_cv_numbers(client):
+    results = client._parse_batch_response(make_response([
+        {**ANALYSIS, "cv_number": 1},
+        {**ANALYSIS, "cv_number": "2", "full_name": "John Roe"}
+    ]), 2)
+
+    assert [r["full_name"] for r in results] == ["Jane Doe", "John Roe"]
+    assert all("cv_number" not in r for r in results)
+
+
+def test_parse_batch_response_rejects_reordered_results(client):
+    with pytest.raises(ValueError, match="does not describe CV 1"):
+        client._parse_batch_response(make_response([
+            {**ANALYSIS, "cv_number": 2},
+            {**ANALYSIS, "cv_number": 1}
+        ]), 2)
+
+
+def test_parse_batch_response_rejects_missing_fields(client):
+    with pytest.raises(ValueError, match="Missing required fields"):
+        client._parse_batch_response(make_response([
+            {"full_name": "Jane Doe", "cv_number": 1}
+        ]), 1)
+
+
+class StatusError(Exception):
+    """An API error carrying an HTTP status code."""
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class APIConnectionError(Exception):
+    """Named like the SDK's connection error class."""
+
+
+def test_is_transient_error():
+    assert is_transient_error(StatusError(429))
+    assert is_transient_error(StatusError(503))
+    assert is_transient_error(APIConnectionError())
+    assert not is_transient_error(StatusError(400))
+    assert not is_transient_error(ValueError("bad"))
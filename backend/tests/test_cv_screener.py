@@ -0,0 +1,233 @@
+"""
+Smoke tests for CV screening.
+Render real PDF pages through CVScreener without calling the AI API.
+"""
+
+import asyncio
+import base64
+import io
+import struct
+import zipfile
+
+import pytest
+
+fitz = pytest.importorskip("fitz")  # PyMuPDF
+
+from backend import cv_screener
+from backend.cv_screener import CVScreener
+
+ROLE_DATA = {
+    "position": "Backend Engineer",
+    "requirements_must_have": ["Python"],
+    "requirements_nice_to_have": ["FastAPI"]
+}
+
+
+def make_pdf(pages: int = 1) -> bytes:
+    """Build an in-memory PDF with a line of text on each page."""
+    doc = fitz.open()
+    for i in range(pages):
+        doc.new_page().insert_text((72, 72), f"Jane Doe - page {i + 1}")
+    return doc.tobytes()
+
+
+@pytest.fixture
+def screener(tmp_path, monkeypatch):
+    """A screener with an isolated cache and no AI client."""
+    monkeypatch.setenv("CV_CACHE_DIR", str(tmp_path / "cache"))
+    cv_screener._get_analysis_cache.cache_clear()
+    yield lambda: CVScreener(ROLE_DATA, client=object())
+    cv_screener._get_analysis_cache.cache_clear()
+
+
+def test_render_cv_png(screener, monkeypatch):
+    monkeypatch.setenv("CV_IMG_FORMAT", "png")
+    images, truncated = screener()._render_cv(make_pdf())
+
+    assert not truncated
+    assert len(images) == 1
+    prefix = "data:image/png;base64,"
+    assert images[0].startswith(prefix)
+    assert base64.b64decode(images[0][len(prefix):]).startswith(b"\x89PNG")
+
+
+def test_render_cv_defaults_to_jpeg(screener, monkeypatch):
+    monkeypatch.delenv("CV_IMG_FORMAT", raising=False)
+    images, _ = screener()._render_cv(make_pdf())
+
+    prefix = "data:image/jpeg;base64,"
+    assert images[0].startswith(prefix)
+    assert base64.b64decode(images[0][len(prefix):]).startswith(b"\xff\xd8\xff")
+
+
+def make_zip(files: dict) -> bytes:
+    """Build an in-memory ZIP from a {name: content} mapping."""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, content in files.items():
+            zf.writestr(name, content)
+    return buf.getvalue()
+
+
+def test_extract_zip_keeps_only_valid_pdfs(screener):
+    pdf = make_pdf()
+    pdf_files = screener()._extract_zip(make_zip({
+        "cvs/jane.pdf": pdf,
+        "fake.pdf": b"not a pdf",
+        "notes.txt": pdf
+    }))
+
+    assert pdf_files == [("jane.pdf", pdf)]
+
+
+def test_extract_zip_skips_entries_with_a_false_declared_size(screener):
+    pdf = make_pdf()
+    data = bytearray(make_zip({"jane.pdf": pdf}))
+    # Patch the central directory to declare a 1 GiB uncompressed size
+    central = data.index(b"PK\x01\x02")
+    struct.pack_into("<I", data, central + 24, 1 << 30)
+
+    assert screener()._extract_zip(bytes(data)) == []
+
+
+def test_extract_zip_skips_entries_with_a_smaller_declared_size(screener):
+    pdf = make_pdf()
+    data = bytearray(make_zip({"jane.pdf": pdf, "john.pdf": pdf}))
+    # Declare the first entry smaller than it is, so its CRC check fails
+    central = data.index(b"PK\x01\x02")
+    struct.pack_into("<I", data, central + 24, len(pdf) // 2)
+
+    assert screener()._extract_zip(bytes(data)) == [("john.pdf", pdf)]
+
+
+ANALYSIS = {
+    "full_name": "Jane Doe",
+    "email": "jane@example.com",
+    "education": "BSc",
+    "experience": "5 years",
+    "skills": "Python",
+    "required_skills_match": 100,
+    "preferred_skills_match": 50,
+    "recommendation": "ACCEPT",
+    "justification": "Strong match"
+}
+
+
+class FakeClient:
+    """Stands in for GeminiAIClient and records how it was called."""
+    def __init__(self, batch_error: Exception = None):
+        self.batch_error = batch_error
+        self.batch_calls = []
+        self.single_calls = 0
+
+    async def analyze_cvs_batch(self, cvs, role_data, prompt=None):
+        self.batch_calls.append([cv_id for _, cv_id in cvs])
+        if self.batch_error:
+            raise self.batch_error
+        return [dict(ANALYSIS) for _ in cvs]
+
+    async def analyze_cv(self, base64_images, role_data, prompt=None):
+        self.single_calls += 1
+        return dict(ANALYSIS)
+
+
+def test_batch_isolates_pdfs_that_fail_to_render(screener):
+    client = FakeClient()
+    cvs = screener()
+    cvs.client = client
+    rows = asyncio.run(cvs._process_batch([
+        ("broken.pdf", b"%PDF-garbage"),
+        ("a.pdf", make_pdf()),
+        ("b.pdf", make_pdf(2))
+    ]))
+
+    assert "Failed to convert PDF to images" in rows[0]["error"]
+    assert [row["full_name"] for row in rows[1:]] == ["Jane Doe", "Jane Doe"]
+    assert client.batch_calls == [["a.pdf", "b.pdf"]]
+
+
+def test_batch_falls_back_to_single_requests_on_parse_failure(screener):
+    client = FakeClient(batch_error=ValueError("Missing required fields"))
+    cvs = screener()
+    cvs.client = client
+    rows = asyncio.run(cvs._process_batch([
+        ("a.pdf", make_pdf()),
+        ("b.pdf", make_pdf())
+    ]))
+
+    assert all("error" not in row for row in rows)
+    assert client.single_calls == 2
+
+
+class BadRequestError(Exception):
+    """An API error for a request the model rejected."""
+    status_code = 400
+
+
+def test_batch_falls_back_to_single_requests_on_rejected_request(screener):
+    client = FakeClient(batch_error=BadRequestError("max_tokens too large"))
+    cvs = screener()
+    cvs.client = client
+    rows = asyncio.run(cvs._process_batch([
+        ("a.pdf", make_pdf()),
+        ("b.pdf", make_pdf(2))
+    ]))
+
+    assert all("error" not in row for row in rows)
+    assert client.single_calls == 2
+
+
+def test_cached_analyses_skip_the_ai_request(screener):
+    client = FakeClient()
+    cvs = screener()
+    cvs.client = client
+    pdf_files = [("a.pdf", make_pdf()), ("b.pdf", make_pdf(2))]
+
+    first = asyncio.run(cvs._process_batch(pdf_files))
+    second = asyncio.run(cvs._process_batch(pdf_files))
+
+    assert first == second
+    assert client.batch_calls == [["a.pdf", "b.pdf"]]
+
+
+def test_cache_key_depends_on_image_format(screener, monkeypatch):
+    pdf = make_pdf()
+    monkeypatch.setenv("CV_IMG_FORMAT", "jpeg")
+    jpeg_key = screener()._cache_key(pdf)
+    monkeypatch.setenv("CV_IMG_FORMAT", "png")
+
+    assert screener()._cache_key(pdf) != jpeg_key
+
+
+def test_analysis_cache_evicts_least_recently_used(screener):
+    assert screener().cache.eviction_policy == "least-recently-used"
+
+
+def test_render_cv_caps_pages(screener, monkeypatch):
+    monkeypatch.setenv("CV_MAX_PAGES", "2")
+    images, truncated = screener()._render_cv(make_pdf(3))
+
+    assert len(images) == 2
+    assert truncated
+
+
+def test_max_pages_is_at_least_one(screener, monkeypatch):
+    monkeypatch.setenv("CV_MAX_PAGES", "0")
+    images, truncated = screener()._render_cv(make_pdf(2))
+
+    assert len(images) == 1
+    assert truncated
+
+
+def test_process_zip_completes_with_zero_concurrency(screener, monkeypatch, tmp_path):
+    monkeypatch.setenv("CV_CONCURRENCY", "0")
+    monkeypatch.chdir(tmp_path)
+    cvs = screener()
+    cvs.client = FakeClient()
+
+    report = asyncio.run(asyncio.wait_for(
+        cvs.process_zip(make_zip({"a.pdf": make_pdf()})), timeout=30
+    ))
+
+    assert (tmp_path / report).exists()
+    assert cvs.get_progress()["percentage"] == 100